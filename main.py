@@ -2,49 +2,426 @@
 # PyQt6 anonymizer that talks to a local Ollama server over HTTP (no llama-cpp bindings).
 # Start Ollama first: `ollama serve` and ensure your model is pulled, e.g.: `ollama pull mistral:7b-instruct-q8_0`
 
-import sys, os, json
+import sys, os, re, json
+import hashlib
+import importlib.util
+import mmap
+import shutil
+import sqlite3
+import tempfile
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional
 import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 import requests
+from requests.adapters import HTTPAdapter
 
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QPushButton, QLabel, QFileDialog, QTextEdit, QProgressBar,
     QMessageBox, QDialog, QDialogButtonBox, QGroupBox, QLineEdit
 )
-from PyQt6.QtCore import Qt, QThread, pyqtSignal
+from PyQt6.QtCore import Qt, QObject, QRunnable, QThread, QThreadPool, pyqtSignal
 from PyQt6.QtGui import QFont
 
-# Optional docx support
+# Optional docx support; python-docx is only imported when a .docx actually needs it
+HAS_DOCX = importlib.util.find_spec("docx") is not None
+
+# Optional faster JSON for the NDJSON stream and request bodies (orjson works on bytes directly)
 try:
-    from docx import Document
-    HAS_DOCX = True
+    import orjson
+    _json_loads = orjson.loads
+    _json_dumps = orjson.dumps
 except Exception:
-    HAS_DOCX = False
+    _json_loads = json.loads
+
+    def _json_dumps(obj) -> bytes:
+        return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+
+# ============================== Documents ==============================
+
+_W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+def _read_docx_text(file_path: str) -> str:
+    """Fast read-only .docx text extraction straight from word/document.xml.
+
+    Mirrors python-docx's `doc.paragraphs` text (top-level body paragraphs, with tabs and breaks)
+    without building its object model. Each body element is dropped from the tree once consumed, so
+    memory stays flat regardless of document length.
+    """
+    import zipfile  # only .docx uploads need these
+    import xml.etree.ElementTree as ET
+
+    body, p, r, t, tab, br, cr = (_W_NS + n for n in ("body", "p", "r", "t", "tab", "br", "cr"))
+    paragraphs: List[str] = []
+    stack: List[str] = []
+    parts: List[str] = []
+    body_elem = None
+    with zipfile.ZipFile(file_path) as zf, zf.open("word/document.xml") as xml:
+        for event, elem in ET.iterparse(xml, events=("start", "end")):
+            if event == "start":
+                stack.append(elem.tag)
+                if elem.tag == body:
+                    body_elem = elem
+                continue
+            stack.pop()
+            # stack now holds the ancestors; only run content of a <w:body>-level paragraph counts, not
+            # nested paragraphs (text boxes), table cells or properties such as <w:pPr><w:tabs><w:tab>
+            in_body_p = (
+                len(stack) > 3 and stack[1] == body and stack[2] == p and stack[-1] == r and stack.count(p) == 1
+            )
+            if in_body_p and elem.tag == t:
+                parts.append(elem.text or "")
+            elif in_body_p and elem.tag == tab:
+                parts.append("\t")
+            elif in_body_p and elem.tag in (br, cr):
+                parts.append("\n")
+            elif len(stack) == 2 and stack[1] == body:
+                if elem.tag == p:
+                    paragraphs.append("".join(parts))
+                parts = []
+                body_elem.clear()  # detach consumed paragraphs/tables instead of keeping empty shells
+    return "\n".join(paragraphs)
+
+
+def load_document_text(file_path: str) -> str:
+    """Read a .txt or .docx file into a string."""
+    if file_path.endswith(".docx"):
+        try:
+            return _read_docx_text(file_path)
+        except Exception:
+            # Unusual package layout: fall back to python-docx's full object model
+            if not HAS_DOCX:
+                raise RuntimeError("python-docx not installed (pip install python-docx)")
+            from docx import Document
+            doc = Document(file_path)
+            return "\n".join(p.text for p in doc.paragraphs)
+    return _read_text_file(file_path)
+
+
+def _read_text_file(file_path: str) -> str:
+    """UTF-8 text with universal newlines, like open(..., "r").read().
+
+    The file is memory-mapped and decoded straight from the mapping, so large uploads are never held
+    as a separate bytes copy next to the decoded string.
+    """
+    with open(file_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return ""  # mmap can't map an empty file
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            text = str(mm, "utf-8")
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
+
+
+# ============================== Cache ==============================
+
+class ChunkCache:
+    """Exact-match cache of anonymized chunks, persisted to a small SQLite file with a bounded in-memory front.
+
+    Keys hash the model, the full static prompt prefix and the chunk, so changing either the model or
+    the few-shot examples never returns stale output. Only anonymized text is stored, never originals.
+    """
+
+    # Recently used outputs kept in memory; SQLite primary-key lookups are cheap, so this stays small
+    MEM_ENTRIES = 256
+
+    def __init__(self, path: str = "anon_cache.sqlite"):
+        self.path = path
+        self._mem: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._opened = False  # the file is opened on first lookup, not while the window starts up
+
+    def _conn(self) -> Optional[sqlite3.Connection]:
+        """The SQLite connection, opened once on demand; None if the disk cache is unavailable. Needs _lock."""
+        if not self._opened:
+            self._opened = True
+            try:
+                self._db = sqlite3.connect(self.path, check_same_thread=False)
+                self._db.execute("CREATE TABLE IF NOT EXISTS chunks (hash TEXT PRIMARY KEY, output TEXT)")
+                self._db.commit()
+            except Exception as e:
+                print("Chunk cache disabled on disk:", e)
+                self._db = None
+        return self._db
+
+    @staticmethod
+    def key_base(model_name: str, prefix: str):
+        """Hash state over model and prefix; copy it per chunk with key_from instead of rehashing the prefix."""
+        h = hashlib.blake2b(digest_size=20)
+        for part in (model_name, prefix):
+            h.update(part.encode("utf-8"))
+            h.update(b"\0")
+        return h
+
+    @staticmethod
+    def key_from(base, chunk: str) -> str:
+        h = base.copy()
+        h.update(chunk.encode("utf-8"))
+        h.update(b"\0")
+        return h.hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            hit = self._mem.get(key)
+            if hit is not None:
+                self._mem.move_to_end(key)
+                return hit
+            db = self._conn()
+            if db is not None:
+                row = db.execute("SELECT output FROM chunks WHERE hash = ?", (key,)).fetchone()
+                if row:
+                    hit = row[0]
+                    self._remember(key, hit)
+            return hit
+
+    def put(self, key: str, output: str):
+        with self._lock:
+            self._remember(key, output)
+            db = self._conn()
+            if db is not None:
+                try:
+                    db.execute("INSERT OR REPLACE INTO chunks (hash, output) VALUES (?, ?)", (key, output))
+                    db.commit()
+                except Exception as e:
+                    print("Error writing chunk cache:", e)
+
+    def _remember(self, key: str, output: str):
+        """Add to the in-memory LRU, evicting the least recently used entry past MEM_ENTRIES. Needs _lock."""
+        self._mem[key] = output
+        self._mem.move_to_end(key)
+        if len(self._mem) > self.MEM_ENTRIES:
+            self._mem.popitem(last=False)
+
+    def close(self):
+        with self._lock:
+            self._opened = True  # never reopen after shutdown
+            if self._db is not None:
+                self._db.close()
+                self._db = None
 
 
 # ============================== Workers ==============================
 
+# Small consecutive chunks are packed into one generate call, separated by this marker in the output
+BATCH_SEP = "<<<SEP>>>"
+_BATCH_LABEL_RE = re.compile(r"^\s*DE-IDENTIFIED(?:\s+\d+)?\s*:\s*", re.IGNORECASE)
+
+# Per-token events only need two fields; pull them out of the raw line instead of building a dict
+_RESPONSE_RE = re.compile(rb'"response":"((?:[^"\\]|\\.)*)"')
+_DONE_TRUE = b'"done":true'
+
+
+def _extract_response(line: bytes) -> Optional[str]:
+    """The "response" string of a stream event, or None if the line needs a full JSON parse."""
+    m = _RESPONSE_RE.search(line)
+    if m is None:
+        return None
+    raw = m.group(1)
+    if b"\\" not in raw:
+        return raw.decode("utf-8")  # Ollama sends non-ASCII as raw UTF-8, so no escapes means plain text
+    try:
+        return _json_loads(b'"' + raw + b'"')  # let the JSON parser handle escape sequences
+    except Exception:
+        return None
+
+
+# Stop before the model starts inventing another few-shot example
+STOP_SEQUENCES = ["\nOriginal:", "\nORIGINAL "]
+# Sections are split at '#' headers, so a new header after a blank line means the model ran past its chunk
+SECTION_STOP = "\n\n#"
+
+
+def _estimate_tokens(text: str) -> int:
+    """Generous token estimate: half the UTF-8 byte length.
+
+    Leaves ~2x headroom for Latin text (~4 bytes/token) and still covers scripts that tokenize
+    close to one token per character.
+    """
+    return len(text.encode("utf-8")) // 2
+
+
+def _predict_budget(chunk: str) -> int:
+    """Token cap for a chunk's output, which is about as long as its input."""
+    return _estimate_tokens(chunk) + 64
+
+
+def _chunk_tokens(chunk: str) -> int:
+    """Context a chunk occupies in a request: its prompt text plus its output budget."""
+    return _estimate_tokens(chunk) + _predict_budget(chunk)
+
+
+# Context window requested from Ollama. Ollama reloads the model whenever num_ctx changes, so warm-ups
+# and every request of a job use this fixed size unless a job's largest prompt needs a bigger one.
+DEFAULT_NUM_CTX = 4096
+# Largest context a job asks for (ANON_MAX_CTX overrides it; the model's trained length always caps it).
+# Ollama allocates the KV cache once per parallel slot, so longer sections are split instead of growing it.
+MAX_NUM_CTX = 16384
+
+
+def _split_section(text: str, max_tokens: int) -> List[str]:
+    """Cut a section into consecutive pieces whose _chunk_tokens fit max_tokens, at line ends when possible.
+
+    The pieces concatenate back to the exact input, so callers can restore the whitespace between them.
+    """
+    max_bytes = max(256, max_tokens - 64)  # _chunk_tokens(x) <= UTF-8 bytes of x + 64
+    pieces: List[str] = []
+    cur: List[str] = []
+    size = 0
+    for line in text.splitlines(keepends=True):
+        n = len(line.encode("utf-8"))
+        if cur and size + n > max_bytes:
+            pieces.append("".join(cur))
+            cur, size = [], 0
+        if n > max_bytes:
+            step = max(1, max_bytes // 4)  # a character is at most 4 UTF-8 bytes
+            pieces.extend(line[k:k + step] for k in range(0, len(line), step))
+            continue
+        cur.append(line)
+        size += n
+    if cur:
+        pieces.append("".join(cur))
+    return pieces
+
+
+RUNTIME_OPTION_ENV = {"ANON_NUM_THREAD": "num_thread", "ANON_GPU_LAYERS": "num_gpu", "ANON_NUM_BATCH": "num_batch"}
+
+
+def _runtime_options() -> dict:
+    """Optional Ollama load/runtime overrides from the environment.
+
+    Ollama picks threads and GPU offload itself; these are only sent when set, and go on every request
+    (warm-ups included) because a change in them also makes Ollama reload the model.
+    """
+    opts = {}
+    for env, key in RUNTIME_OPTION_ENV.items():
+        value = os.environ.get(env, "").strip()
+        if value:
+            try:
+                opts[key] = int(value)
+            except ValueError:
+                print(f"Ignoring {env}={value!r}: not an integer")
+    return opts
+
+
+# Upper bound on concurrent generate streams per job; Ollama itself rarely serves more than a few at once
+MAX_STREAMS = 16
+
+_stream_pool: Optional[ThreadPoolExecutor] = None
+_stream_pool_lock = threading.Lock()
+
+
+def _get_stream_pool() -> ThreadPoolExecutor:
+    """Process-wide stream threads, created on first use and reused by every job for the app's lifetime."""
+    global _stream_pool
+    with _stream_pool_lock:
+        if _stream_pool is None:
+            _stream_pool = ThreadPoolExecutor(max_workers=MAX_STREAMS, thread_name_prefix="ollama-stream")
+        return _stream_pool
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return max(1, int(os.environ.get(name, default)))
+    except ValueError:
+        return default
+
+
+def _make_session(pool_size: int = 8) -> requests.Session:
+    """Session with a keep-alive connection pool, so each request reuses an open socket to Ollama."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _keep_alive_value(keep_alive: str):
+    """Ollama's keep_alive takes a duration string ("30m") or a number of seconds (-1 = stay loaded forever)."""
+    try:
+        return int(keep_alive)
+    except (TypeError, ValueError):
+        return keep_alive
+
+
+# Instruction header sent ahead of the few-shot examples. Together they form a prefix that is
+# byte-identical for every chunk, so Ollama can reuse the already-evaluated KV cache for it.
+ANON_INSTRUCTION = (
+    "Replace all names, places, dates, and ages in the following text with ***. "
+    "Respond only with the modified text, no explanations.\n\n"
+)
+
+
+def build_static_prefix(examples: str) -> str:
+    """Instruction + few-shot examples, normalized to end with a single blank line so the prefix never drifts."""
+    return ANON_INSTRUCTION + examples.strip() + "\n\n"
+
+
+def _warm_up_body(model_name: str, keep_alive: str, prefix: str = "", num_ctx: int = DEFAULT_NUM_CTX) -> dict:
+    """Generate body that loads the model and, given the static prefix, evaluates it once.
+
+    Ollama keeps the evaluated prompt in its KV cache, so the first chunks of the next job only
+    prefill their own text. An empty prompt just loads the model.
+    """
+    body = {
+        "model": model_name,
+        "prompt": prefix,
+        "stream": False,
+        "options": {"num_ctx": num_ctx, **_runtime_options()},
+        "keep_alive": _keep_alive_value(keep_alive),
+    }
+    if prefix:
+        body["options"].update(num_predict=1, temperature=0.0)
+    return body
+
+
+def _preload_model(base_url: str, model_name: str, keep_alive: str, prefix: str = "", probe: bool = False):
+    """Ask Ollama to load the model (and prime the prompt prefix) in the background.
+
+    With probe=True a quick /api/tags check runs first, so nothing is attempted when Ollama isn't up.
+    """
+    try:
+        if probe:
+            requests.get(f"{base_url.rstrip('/')}/api/tags", timeout=0.5).raise_for_status()
+        requests.post(
+            f"{base_url.rstrip('/')}/api/generate",
+            json=_warm_up_body(model_name, keep_alive, prefix),
+            timeout=180,
+        )
+    except Exception:
+        pass  # best effort; validation and processing report real errors
+
+
 class OllamaValidateWorker(QThread):
     """Checks that Ollama is reachable and the model exists; warms it with a tiny non-streamed generate."""
     validated = pyqtSignal(str)   # model name
     error = pyqtSignal(str)
 
-    def __init__(self, base_url: str, model_name: str):
+    def __init__(self, base_url: str, model_name: str, keep_alive: str = "-1", prefix: str = ""):
         super().__init__()
         self.base_url = base_url.rstrip("/")
         self.model_name = model_name
+        self.keep_alive = keep_alive
+        self.prefix = prefix  # static prompt prefix to prime in Ollama's KV cache while warming up
         self._cancel = threading.Event()
 
     def cancel(self):
         self._cancel.set()
 
     def run(self):
+        session = _make_session(pool_size=1)
         try:
             # 1) Fast existence check that doesn't force a model load
             try:
-                r = requests.post(
+                r = session.post(
                     f"{self.base_url}/api/show",
                     json={"name": self.model_name, "verbose": False},
                     timeout=60,
@@ -62,15 +439,8 @@ class OllamaValidateWorker(QThread):
                 return
 
             # 2) Tiny non-stream generate to warm the model (allow time for cold load)
-            body = {
-                "model": self.model_name,
-                "prompt": "ping",
-                "stream": False,
-                "temperature": 0.0,
-                "num_predict": 8,
-                "keep_alive": "10m",  # keep model resident for subsequent requests
-            }
-            r = requests.post(
+            body = _warm_up_body(self.model_name, self.keep_alive, self.prefix or "ping")
+            r = session.post(
                 f"{self.base_url}/api/generate",
                 json=body,
                 timeout=180,  # first cold start can be slow, especially on Windows
@@ -87,89 +457,419 @@ class OllamaValidateWorker(QThread):
             self.validated.emit(self.model_name)
         except Exception as e:
             self.error.emit(str(e))
+        finally:
+            session.close()
 
 
-class OllamaAnonymizationWorker(QThread):
-    """Streams chunk-by-chunk anonymization via Ollama /api/generate."""
+class AnonymizationSignals(QObject):
     progress_updated = pyqtSignal(int, int)
-    chunk_processed = pyqtSignal(str, str)
-    finished = pyqtSignal(list)
+    chunk_processed = pyqtSignal(int, str)  # chunk index, anonymized text ("" if the chunk failed)
+    finished = pyqtSignal(list)  # indices of chunks that failed and should keep their original text
     error_occurred = pyqtSignal(str)
 
-    def __init__(self, base_url: str, model_name: str, prompt: str, chunks: List[str]):
+
+class OllamaAnonymizationWorker(QRunnable):
+    """Streams chunk-by-chunk anonymization via Ollama /api/generate on a QThreadPool thread."""
+
+    def __init__(self, base_url: str, model_name: str, prompt: str, chunks: List[str], max_workers: int = 4,
+                 cache: Optional[ChunkCache] = None, batch_char_budget: int = 1500, keep_alive: str = "-1"):
         super().__init__()
         self.base_url = base_url.rstrip("/")
         self.model_name = model_name
         self.prompt = prompt
+        self._static_prefix = build_static_prefix(prompt)  # built once, identical for every chunk
+        self._prefix_json = _json_dumps(self._static_prefix)[1:-1]  # its JSON string body, without quotes
+        self._prefix_token_count = _estimate_tokens(self._static_prefix) + 128  # + packing instructions/labels
+        self._key_base = ChunkCache.key_base(model_name, self._static_prefix) if cache is not None else None
         self.chunks = list(chunks)
+        # concurrent in-flight /api/generate streams; never more threads than chunks or MAX_STREAMS
+        self.max_workers = max(1, min(int(max_workers), MAX_STREAMS, len(self.chunks) or 1))
+        self.cache = cache
+        self.batch_char_budget = batch_char_budget  # max combined chars per packed request; 0 disables packing
+        self.keep_alive = keep_alive
+        self.num_ctx = DEFAULT_NUM_CTX  # sized once per job in run(), see _context_size
+        self.max_ctx = MAX_NUM_CTX  # upper bound for num_ctx, resolved in run(), see _context_limit
+        self._runtime_options = _runtime_options()
+        self._session: Optional[requests.Session] = None
         self._stop = threading.Event()
+        self._last_progress_t = 0.0
+        self._pending_progress: Optional[tuple] = None  # latest (done, total) held back by the throttle
+        self._active_responses = set()  # open generate streams, closed on cancel to unblock their reads
+        self._responses_lock = threading.Lock()
+        self.signals = AnonymizationSignals()
+        self.setAutoDelete(False)  # the window keeps a reference and polls isRunning() after run() returns
+        self._started = False
+        self._done = threading.Event()
+
+    def start(self):
+        self._started = True
+        QThreadPool.globalInstance().start(self)
+
+    def isRunning(self) -> bool:
+        return self._started and not self._done.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return not self._started or self._done.wait(timeout)
 
     def cancel(self):
         self._stop.set()
+        with self._responses_lock:
+            responses = list(self._active_responses)
+        for r in responses:
+            try:
+                r.close()  # aborts a read blocked mid-generation; the stream loop then exits
+            except Exception:
+                pass
 
-    def _stream_ollama(self, full_prompt: str, timeout: int = 300) -> str:
-        """Stream /api/generate and collect 'response' pieces."""
+    def _emit_progress(self, done: int, total: int):
+        # Cached/packed chunks can finish in bursts; at most one cross-thread progress signal per 50 ms
+        now = time.monotonic()
+        if done == total or now - self._last_progress_t >= 0.05:
+            self._last_progress_t = now
+            self._pending_progress = None
+            self.signals.progress_updated.emit(done, total)
+        else:
+            self._pending_progress = (done, total)
+
+    def _flush_progress(self):
+        """Emit a value the throttle held back; called before blocking so a burst never ends on a stale count."""
+        if self._pending_progress is not None:
+            done, total = self._pending_progress
+            self._pending_progress = None
+            self._last_progress_t = time.monotonic()
+            self.signals.progress_updated.emit(done, total)
+
+    @property
+    def cancelled(self) -> bool:
+        return self._stop.is_set()
+
+    def _stream_ollama(self, prompt_suffix: str, num_predict: int = 1000, timeout: int = 300,
+                       stop: Optional[List[str]] = None) -> str:
+        """Stream /api/generate for static prefix + prompt_suffix and collect 'response' pieces."""
         url = f"{self.base_url}/api/generate"
         body = {
             "model": self.model_name,
-            "prompt": full_prompt,
             "stream": True,
-            "num_predict": 1000,  # max_tokens
-            "temperature": 0.5,
-            "top_p": 0.5,
-            "repeat_penalty": 1.2,
-            "keep_alive": "30m",  # prevent model from being unloaded between chunks
+            "options": {  # Ollama only honours sampling parameters inside "options"
+                "num_ctx": self.num_ctx,  # same for every request of the job, so the model is never reloaded
+                "num_predict": num_predict,  # max_tokens
+                # Greedy decoding: the task is a deterministic substitution, so skip sampling entirely
+                "temperature": 0.0,
+                "top_k": 1,
+                "top_p": 1.0,
+                "repeat_penalty": 1.0,  # copied text legitimately repeats names and phrases
+                "stop": stop or STOP_SEQUENCES,
+                **self._runtime_options,
+            },
+            # Sent on every request: omitting it resets the model's unload timer to Ollama's 5m default
+            "keep_alive": _keep_alive_value(self.keep_alive),
         }
         parts: List[str] = []
-        with requests.post(url, json=body, stream=True, timeout=timeout) as r:
-            r.raise_for_status()
-            for line in r.iter_lines(decode_unicode=True):
-                if self._stop.is_set():
-                    break
-                if not line:
-                    continue
-                try:
-                    data = json.loads(line)
-                except Exception:
-                    continue
-                piece = data.get("response", "")
+
+        def consume(line: bytes) -> bool:
+            """Parse one NDJSON event into parts; returns True once Ollama reports done."""
+            if not line or line.isspace():  # no stripped copy per event
+                return False
+            piece = _extract_response(line)
+            if piece is not None:
                 if piece:
                     parts.append(piece)
-                if data.get("done"):
-                    break
+                return _DONE_TRUE in line
+            try:
+                data = _json_loads(line)
+            except Exception:
+                return False
+            piece = data.get("response", "")
+            if piece:
+                parts.append(piece)
+            return bool(data.get("done"))
+
+        tail = bytearray()  # trailing partial line carried over between 64 KB reads
+        done = False
+        # The prefix was JSON-encoded once in __init__; only the chunk-dependent suffix is encoded per request
+        data = b'{"prompt":"' + self._prefix_json + _json_dumps(prompt_suffix)[1:-1] + b'",' + _json_dumps(body)[1:]
+        with self._session.post(url, data=data, headers=JSON_HEADERS, stream=True, timeout=timeout) as r:
+            with self._responses_lock:
+                self._active_responses.add(r)
+            try:
+                if self._stop.is_set():  # cancelled while the request was being sent
+                    return ""
+                r.raise_for_status()
+                for buf in r.iter_content(chunk_size=65536, decode_unicode=False):
+                    if self._stop.is_set():
+                        break
+                    if not buf:
+                        continue
+                    tail += buf
+                    lines = tail.split(b"\n")
+                    tail = bytearray(lines.pop())
+                    for line in lines:
+                        if consume(line):
+                            done = True
+                            break
+                    if done:
+                        break
+                else:
+                    consume(bytes(tail))  # stream ended without a final newline
+            except Exception:
+                if not self._stop.is_set():
+                    raise
+                # cancel() closed the socket under us: that's a cancellation, not an error
+            finally:
+                with self._responses_lock:
+                    self._active_responses.discard(r)
         return "".join(parts).strip()
 
+    def _prime_prefix(self):
+        """Evaluate the static prefix once before fanning out.
+
+        Concurrent streams that all start on a cold cache would each prefill the same few-shot prefix;
+        once one evaluation is cached, Ollama reuses it and every chunk only prefills its own text.
+        Nearly free when the validate/preload warm-up already primed the same prefix.
+        """
+        try:
+            self._session.post(
+                f"{self.base_url}/api/generate",
+                data=_json_dumps(_warm_up_body(self.model_name, self.keep_alive, self._static_prefix, self.num_ctx)),
+                headers=JSON_HEADERS,
+                timeout=180,
+            )
+        except Exception:
+            pass  # best effort; the chunk requests report real errors
+
+    def _cache_key(self, chunk: str) -> Optional[str]:
+        if self._key_base is None:
+            return None
+        return ChunkCache.key_from(self._key_base, chunk)
+
+    def _store(self, key: Optional[str], text: str):
+        # A cancelled stream returns partial output, which must not be cached
+        if key is not None and text and not self._stop.is_set():
+            self.cache.put(key, text)
+
+    def _process_chunk(self, chunk: str) -> str:
+        if self._stop.is_set():
+            return ""
+        key = self._cache_key(chunk)  # run() already served cache hits; the key is only used to store
+        room = self.num_ctx - self._prefix_token_count
+        if _chunk_tokens(chunk) <= room:
+            text = self._anonymize_text(chunk)
+        else:
+            # Larger than the capped context: anonymize it piece by piece and keep the original whitespace
+            # between the pieces (each answer comes back stripped)
+            outputs: List[str] = []
+            for piece in _split_section(chunk, room):
+                out = self._anonymize_text(piece)
+                if not out or self._stop.is_set():
+                    return ""  # a partial section is treated as a failed chunk
+                outputs.append(out + piece[len(piece.rstrip()):])
+            text = "".join(outputs).strip()
+        self._store(key, text)
+        return text
+
+    def _anonymize_text(self, chunk: str) -> str:
+        # Construct few-shot prompt: static prefix first, chunk-dependent text only at the end
+        # Packed requests can't use the header stop: every block after a separator starts with its own header
+        stop = STOP_SEQUENCES if SECTION_STOP in chunk else STOP_SEQUENCES + [SECTION_STOP]
+        return self._stream_ollama(f"Original: {chunk}\nDe-identified: ", num_predict=_predict_budget(chunk), stop=stop)
+
+    def _process_batch(self, chunks: List[str]) -> List[Optional[str]]:
+        """Anonymize several small chunks with one request; None marks chunks the packed answer didn't cover."""
+        if self._stop.is_set():
+            return [None] * len(chunks)
+        # run() only groups cache misses, so every chunk here goes to the model
+        keys = [self._cache_key(c) for c in chunks]
+        results: List[Optional[str]] = [None] * len(chunks)
+        blocks = "\n\n".join(f"ORIGINAL {n}: {chunk}" for n, chunk in enumerate(chunks, start=1))
+        prompt_suffix = (
+            f"Process each ORIGINAL block below. For each one output exactly one DE-IDENTIFIED block, "
+            f"in the same order, separated by {BATCH_SEP}.\n\n"
+            + blocks + "\n\nDE-IDENTIFIED 1: "
+        )
+        budget = sum(_predict_budget(chunk) for chunk in chunks)
+        output = self._stream_ollama(prompt_suffix, num_predict=budget)
+        pieces = [_BATCH_LABEL_RE.sub("", p).strip() for p in output.split(BATCH_SEP)]
+        if pieces and not pieces[-1]:
+            pieces.pop()  # tolerate a trailing separator
+        if len(pieces) == len(chunks) and all(pieces) and not self._stop.is_set():
+            for j, text in enumerate(pieces):
+                results[j] = text
+                self._store(keys[j], text)
+        return results
+
+    def _group_chunks(self, indices: Optional[List[int]] = None) -> List[List[int]]:
+        """Pack consecutive chunks whose combined length fits batch_char_budget; large chunks stay alone.
+
+        A group is also closed before its prompt + output would outgrow DEFAULT_NUM_CTX, so packing alone
+        never forces a larger context (and a model reload) on dense scripts such as CJK text.
+        """
+        group_ctx = min(DEFAULT_NUM_CTX, self.max_ctx)
+        groups: List[List[int]] = []
+        cur: List[int] = []
+        size = 0
+        tokens = self._prefix_token_count
+        for i in range(len(self.chunks)) if indices is None else indices:
+            chunk = self.chunks[i]
+            chunk_tokens = _chunk_tokens(chunk)
+            if cur and (size + len(chunk) > self.batch_char_budget or tokens + chunk_tokens > group_ctx):
+                groups.append(cur)
+                cur, size, tokens = [], 0, self._prefix_token_count
+            cur.append(i)
+            size += len(chunk)
+            tokens += chunk_tokens
+        if cur:
+            groups.append(cur)
+        return groups
+
+    def _context_size(self, groups: List[List[int]]) -> int:
+        """One context size for the whole job, large enough for its biggest prompt plus output.
+
+        Keeps DEFAULT_NUM_CTX (what the warm-ups loaded) whenever that fits, otherwise rounds the
+        worst case up to a multiple of 1024 so the model is reloaded at most once for this job. Never
+        exceeds max_ctx; sections that still don't fit are split by _process_chunk.
+        """
+        prefix_tokens = self._prefix_token_count
+        need = max(prefix_tokens + sum(_chunk_tokens(self.chunks[i]) for i in group) for group in groups)
+        return min(self.max_ctx, max(DEFAULT_NUM_CTX, -(-need // 1024) * 1024))
+
+    def _context_limit(self) -> int:
+        """ANON_MAX_CTX (default MAX_NUM_CTX), lowered to the model's trained context length when known."""
+        limit = _env_int("ANON_MAX_CTX", MAX_NUM_CTX)
+        try:
+            r = self._session.post(f"{self.base_url}/api/show", json={"name": self.model_name}, timeout=10)
+            r.raise_for_status()
+            info = r.json().get("model_info") or {}
+            trained = [v for k, v in info.items() if k.endswith(".context_length") and isinstance(v, int)]
+            if trained:
+                limit = min(limit, max(trained))
+        except Exception:
+            pass  # older Ollama or unknown architecture: the configured limit alone applies
+        return limit
+
+    def _process_group(self, group: List[int]) -> List[str]:
+        if len(group) == 1:
+            return [self._process_chunk(self.chunks[group[0]])]
+        results = self._process_batch([self.chunks[i] for i in group])
+        # Packed answer couldn't be split back: retry those chunks one by one
+        for j, i in enumerate(group):
+            if results[j] is None and not self._stop.is_set():
+                try:
+                    results[j] = self._process_chunk(self.chunks[i])
+                except Exception as e:
+                    self.signals.error_occurred.emit(f"Chunk {i + 1} error: {e}")
+        return [r or "" for r in results]
+
     def run(self):
+        # One pooled session shared by all streams of this job (requests.Session is safe for concurrent posts)
+        self._session = _make_session(pool_size=max(8, self.max_workers))
         try:
-            out = []
             total = len(self.chunks)
-            for i, chunk in enumerate(self.chunks, start=1):
+            failed: List[int] = []
+            done = 0
+            # Chunks are independent, so keep several streams in flight. Results are only emitted, not kept:
+            # the receiver puts them back in document order and owns the original text for failed chunks.
+            # The shared pool is bounded per job by submitting at most max_workers groups at a time.
+            # Cache hits are emitted up front, so only real model work is grouped, sized and dispatched
+            to_process: List[int] = []
+            for i, chunk in enumerate(self.chunks):
+                key = self._cache_key(chunk)
+                hit = self.cache.get(key) if key is not None else None
+                if hit is None:
+                    to_process.append(i)
+                    continue
+                done += 1
+                self.signals.chunk_processed.emit(i, hit)
+                self._emit_progress(done, total)
+
+            pool = _get_stream_pool()
+            if to_process:
+                self.max_ctx = self._context_limit()
+            group_list = self._group_chunks(to_process)
+            if group_list:
+                self.num_ctx = self._context_size(group_list)
+            self._flush_progress()  # cache hits are done; show them before the first model request
+            if len(group_list) > 1 and self.max_workers > 1 and not self._stop.is_set():
+                # Run on the pool and poll: a cold model load can take minutes and a blocking post can't be
+                # aborted, so a cancel leaves the prime to finish on its own instead of waiting for it
+                prime = pool.submit(self._prime_prefix)
+                while not prime.done() and not self._stop.wait(0.1):
+                    pass
+            groups = iter(group_list)
+            in_flight = {}
+
+            def submit_next():
                 if self._stop.is_set():
-                    break
-                # Construct few-shot prompt
-                full_prompt = (
-                    "Replace all names, places, dates, and ages in the following text with ***. "
-                    "Respond only with the modified text, no explanations.\n\n"
-                    + self.prompt +
-                    f"Original: {chunk}\nDe-identified: "
-                )
-                try:
-                    text = self._stream_ollama(full_prompt)
-                except Exception as e:
-                    text = chunk  # fallback to original if a chunk fails
-                    self.error_occurred.emit(f"Chunk {i} error: {e}")
+                    return
+                group = next(groups, None)
+                if group is not None:
+                    in_flight[pool.submit(self._process_group, group)] = group
+
+            for _ in range(self.max_workers):
+                submit_next()
+            while in_flight and not self._stop.is_set():
+                self._flush_progress()
+                completed, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for fut in completed:
+                    group = in_flight.pop(fut)
+                    if self._stop.is_set():
+                        break
+                    try:
+                        texts = fut.result()
+                    except Exception as e:
+                        texts = [""] * len(group)  # receiver falls back to the original text
+                        first, last = group[0] + 1, group[-1] + 1
+                        label = f"Chunk {first}" if first == last else f"Chunks {first}-{last}"
+                        self.signals.error_occurred.emit(f"{label} error: {e}")
+
+                    for i, text in zip(group, texts):
+                        if not text:
+                            failed.append(i)
+                        done += 1
+                        self.signals.chunk_processed.emit(i, text or "")
+                        self._emit_progress(done, total)
+                    submit_next()
+            # After a cancel, let the (already aborted) streams unwind before the session is closed
+            wait(in_flight)
+
+            self.signals.finished.emit(sorted(failed))
+        except Exception as e:
+            self.signals.error_occurred.emit(str(e))
+        finally:
+            self._session.close()
+            self._done.set()
+
+
+class DocumentLoaderSignals(QObject):
+    loaded = pyqtSignal(str, str)  # file path, text
+    failed = pyqtSignal(str)
+
 
-                out.append(text or chunk)
-                self.chunk_processed.emit(chunk, text or chunk)
-                self.progress_updated.emit(i, total)
+class DocumentLoader(QRunnable):
+    """Reads a document on a QThreadPool thread so large files don't freeze the window."""
 
-            self.finished.emit(out)
+    def __init__(self, file_path: str):
+        super().__init__()
+        self.file_path = file_path
+        self.signals = DocumentLoaderSignals()
+
+    def run(self):
+        try:
+            text = load_document_text(self.file_path)
         except Exception as e:
-            self.error_occurred.emit(str(e))
+            self.signals.failed.emit(str(e))
+            return
+        self.signals.loaded.emit(self.file_path, text)
 
 
 # ============================== UI ==============================
 
+# Zero-width split point at the start of every '#'-header line (see TextAnonymizer._chunk_text)
+_HEADER_RE = re.compile(r"(?m)^(?=[^\S\n]*#[^\n]*\S)")
+
+# 8/16-bit model tags read more weight bytes per token than the 4-bit q4_K_M builds
+_HEAVY_QUANT_RE = re.compile(r"[:_-](?:q8_0|f16|fp16|bf16|f32|fp32)(?:$|[_-])", re.IGNORECASE)
+
+
 class SettingsDialog(QDialog):
     def __init__(self, current_examples: str = "", parent=None):
         super().__init__(parent)
@@ -217,12 +917,26 @@ class TextAnonymizer(QMainWindow):
         self.ollama_url = "http://127.0.0.1:11434"
         # Default to the user's tag; user can change in the UI
         self.model_name = "mistral:7b-instruct-q8_0"
+        # number of chunks streamed concurrently, only set when settings.json has it; otherwise each job
+        # matches the server's decode slots via OLLAMA_NUM_PARALLEL in this environment, or uses 4
+        self.max_workers: Optional[int] = None
+        # how long Ollama keeps the model loaded after a request ("-1" = until Ollama stops, or e.g. "30m")
+        self.keep_alive = "-1"
 
         self.model_worker: Optional[OllamaValidateWorker] = None
         self.proc_worker: Optional[OllamaAnonymizationWorker] = None
+        self.chunk_cache = ChunkCache("anon_cache.sqlite")
 
         self.original_text = ""
-        self.anonymized_chunks: List[str] = []
+        self._doc_loader: Optional[DocumentLoader] = None
+        # Results are written to a temp file in document order as chunks complete (see _on_chunk_processed)
+        self._results_file = None
+        self._results_path: Optional[str] = None
+        self._pending_results: Dict[int, str] = {}
+        self._job_chunks: List[str] = []  # originals of the running job, used for chunks that failed
+        self._job_positions: List[List[int]] = []  # worker (deduplicated) chunk index -> document positions
+        self._next_result = 0
+        self._results_written = 0
 
         self.settings_file = "settings.json"
         self.default_examples = (
@@ -237,6 +951,8 @@ class TextAnonymizer(QMainWindow):
 
         self._init_ui()
         self._load_settings()
+        # Start loading the default model while the user picks a document (skipped if Ollama isn't running)
+        self._warm_up_model(probe=True)
 
     def _init_ui(self):
         self.setWindowTitle("Text Anonymizer - Ollama")
@@ -349,6 +1065,7 @@ class TextAnonymizer(QMainWindow):
     # ---------------- Settings file ----------------
 
     def _load_settings(self):
+        s = {}
         try:
             if os.path.exists("settings.json"):
                 with open("settings.json", "r", encoding="utf-8") as f:
@@ -357,6 +1074,18 @@ class TextAnonymizer(QMainWindow):
         except Exception as e:
             print("Error loading settings:", e)
             self.current_examples = self.default_examples
+            s = {}
+        # Performance settings are parsed on their own, so a bad value never costs the user their examples
+        if "max_workers" in s:
+            try:
+                self.max_workers = int(s["max_workers"])
+            except (TypeError, ValueError):
+                print("Ignoring invalid max_workers in settings.json:", s["max_workers"])
+        keep_alive = s.get("keep_alive")
+        if isinstance(keep_alive, (str, int)) and not isinstance(keep_alive, bool):
+            self.keep_alive = str(keep_alive)
+        elif keep_alive is not None:
+            print("Ignoring invalid keep_alive in settings.json:", keep_alive)
         self.current_examples_label.setText(
             "Custom examples loaded" if self.current_examples != self.default_examples else "Default examples loaded"
         )
@@ -364,7 +1093,10 @@ class TextAnonymizer(QMainWindow):
     def _save_settings(self):
         try:
             with open("settings.json", "w", encoding="utf-8") as f:
-                json.dump({"examples": self.current_examples}, f, indent=2)
+                settings = {"examples": self.current_examples, "keep_alive": self.keep_alive}
+                if self.max_workers is not None:  # never pin the OLLAMA_NUM_PARALLEL default into the file
+                    settings["max_workers"] = self.max_workers
+                json.dump(settings, f, indent=2)
         except Exception as e:
             print("Error saving settings:", e)
 
@@ -384,7 +1116,10 @@ class TextAnonymizer(QMainWindow):
         self.model_status.setText("Validating model...")
         self.model_status.setStyleSheet("color:#f39c12; font-weight:bold;")
 
-        self.model_worker = OllamaValidateWorker(self.ollama_url, self.model_name)
+        self.model_worker = OllamaValidateWorker(
+            self.ollama_url, self.model_name,
+            keep_alive=self.keep_alive, prefix=build_static_prefix(self.current_examples)
+        )
         self.model_worker.validated.connect(self._on_model_validated)
         self.model_worker.error.connect(self._on_model_error)
         self.model_worker.finished.connect(self._on_model_done)
@@ -394,6 +1129,11 @@ class TextAnonymizer(QMainWindow):
         self.model_status.setText(f"✓ {model_name} (validated)")
         self.model_status.setStyleSheet("color:#27ae60; font-weight:bold;")
         self.statusBar().showMessage("Model validated successfully")
+        if _HEAVY_QUANT_RE.search(model_name):
+            # 4-bit builds usually generate faster, but quantization can change what gets redacted
+            hint = "8/16-bit model: a q4_K_M tag is usually faster; verify its output quality before switching"
+            self.model_status.setText(f"✓ {model_name} (validated) - {hint}")
+            self.statusBar().showMessage(f"Model validated successfully. {hint}.")
         if self.original_text:
             self.process_btn.setEnabled(True)
         else:
@@ -426,25 +1166,47 @@ class TextAnonymizer(QMainWindow):
         )
         if not file_path:
             return
-        try:
-            if file_path.endswith(".docx"):
-                if not HAS_DOCX:
-                    raise RuntimeError("python-docx not installed (pip install python-docx)")
-                doc = Document(file_path)
-                self.original_text = "\n".join(p.text for p in doc.paragraphs)
-            else:
-                with open(file_path, "r", encoding="utf-8") as f:
-                    self.original_text = f.read()
+        self.upload_btn.setEnabled(False)
+        self.statusBar().showMessage(f"Loading {Path(file_path).name}...")
+        self._warm_up_model()  # load the model while the file is read
+
+        self._doc_loader = DocumentLoader(file_path)  # keep a reference until its signals have fired
+        self._doc_loader.signals.loaded.connect(self._on_document_loaded)
+        self._doc_loader.signals.failed.connect(self._on_document_failed)
+        QThreadPool.globalInstance().start(self._doc_loader)
+
+    def _on_document_loaded(self, file_path: str, text: str):
+        self._doc_loader = None
+        self.original_text = text
+        self.upload_btn.setEnabled(True)
+        self.file_label.setText(f"Loaded: {Path(file_path).name}")
+        self.file_label.setStyleSheet("color:#27ae60; font-weight:bold;")
+        self.statusBar().showMessage(f"Document loaded: {Path(file_path).name}")
+
+        if "validated" in self.model_status.text().lower():
+            self.process_btn.setEnabled(True)
 
-            self.file_label.setText(f"Loaded: {Path(file_path).name}")
-            self.file_label.setStyleSheet("color:#27ae60; font-weight:bold;")
-            self.statusBar().showMessage(f"Document loaded: {Path(file_path).name}")
+    def _on_document_failed(self, msg: str):
+        self._doc_loader = None
+        self.upload_btn.setEnabled(True)
+        QMessageBox.critical(self, "Error Loading Document", f"Failed to load document: {msg}")
+        self.statusBar().showMessage("Error loading document")
 
-            if "validated" in self.model_status.text().lower():
-                self.process_btn.setEnabled(True)
-        except Exception as e:
-            QMessageBox.critical(self, "Error Loading Document", f"Failed to load document: {e}")
-            self.statusBar().showMessage("Error loading document")
+    def _warm_up_model(self, probe: bool = False):
+        """Fire-and-forget model load + prefix priming so both are ready by the time the user clicks Start."""
+        if self.proc_worker and self.proc_worker.isRunning():
+            # The warm-up loads at DEFAULT_NUM_CTX; a job that grew num_ctx would have its model reloaded twice
+            return
+        self.ollama_url = self.url_edit.text().strip() or self.ollama_url
+        self.model_name = self.model_edit.text().strip() or self.model_name
+        if not self.model_name:
+            return
+        prefix = build_static_prefix(self.current_examples)
+        threading.Thread(
+            target=_preload_model,
+            args=(self.ollama_url, self.model_name, self.keep_alive, prefix, probe),
+            daemon=True,
+        ).start()
 
     def _open_settings(self):
         dlg = SettingsDialog(self.current_examples, self)
@@ -455,23 +1217,13 @@ class TextAnonymizer(QMainWindow):
                 self.current_examples_label.setText("Custom examples loaded")
                 self._save_settings()
                 self.statusBar().showMessage("Settings updated")
+                if "validated" in self.model_status.text().lower():
+                    self._warm_up_model()  # the cached prefix changed with the examples
 
     def _chunk_text(self, text: str) -> List[str]:
         """Simple chunker: split by '#'-headers; if none, returns the whole text as one chunk."""
-        lines = text.split("\n")
-        chunks, cur = [], []
-        found_header = False
-        for line in lines:
-            if line.strip().startswith("#") and line.strip() != "#":
-                found_header = True
-                if cur:
-                    chunks.append("\n".join(cur).strip())
-                    cur = []
-            cur.append(line)
-        if cur:
-            chunks.append("\n".join(cur).strip())
-        chunks = [c for c in chunks if c.strip()]
-        return chunks if found_header else [text.strip()] if text.strip() else []
+        # A header is any line that starts with '#' after leading whitespace and isn't a bare '#'
+        return [c for c in (p.strip() for p in _HEADER_RE.split(text)) if c]
 
     def _start_anonymization(self):
         if not self.process_btn.isEnabled():
@@ -479,7 +1231,7 @@ class TextAnonymizer(QMainWindow):
         if not self.current_examples.strip():
             QMessageBox.warning(self, "No Examples", "Please configure the few-shot examples first.")
             return
-        if not self.original_text.strip():
+        if not self.original_text or self.original_text.isspace():  # avoids copying the whole document
             QMessageBox.warning(self, "No Document", "Please upload a document first.")
             return
 
@@ -500,28 +1252,47 @@ class TextAnonymizer(QMainWindow):
             else:
                 return
 
+        # Repeated sections (boilerplate headers/footers) are sent once and copied back to every position.
+        # Copies that differ only in line endings or trailing spaces count as repeats too.
+        unique: Dict[str, int] = {}
+        unique_chunks: List[str] = []
+        positions: List[List[int]] = []
+        for pos, chunk in enumerate(chunks):
+            key = "\n".join(line.rstrip() for line in chunk.splitlines())
+            u = unique.setdefault(key, len(unique))
+            if u == len(positions):
+                unique_chunks.append(chunk)
+                positions.append([])
+            positions[u].append(pos)
+
         self.process_btn.setVisible(False)
         self.cancel_btn.setVisible(True)
         self.progress_bar.setVisible(True)
-        self.progress_bar.setMaximum(len(chunks))
+        self.progress_bar.setMaximum(len(unique_chunks))
         self.progress_bar.setValue(0)
         self.progress_label.setVisible(True)
-        self.progress_label.setText(f"Processing 0 of {len(chunks)} chunks...")
+        self.progress_label.setText(f"Processing 0 of {len(unique_chunks)} chunks...")
 
         # (Re)read URL/model from fields
         self.ollama_url = self.url_edit.text().strip() or self.ollama_url
         self.model_name = self.model_edit.text().strip() or self.model_name
 
+        self._open_results_file()
+        self._job_chunks = chunks
+        self._job_positions = positions
         self.proc_worker = OllamaAnonymizationWorker(
             base_url=self.ollama_url,
             model_name=self.model_name,
             prompt=self.current_examples,
-            chunks=chunks
+            chunks=unique_chunks,
+            max_workers=self.max_workers or _env_int("OLLAMA_NUM_PARALLEL", 4),
+            cache=self.chunk_cache,
+            keep_alive=self.keep_alive,
         )
-        self.proc_worker.progress_updated.connect(self._on_progress)
-        self.proc_worker.chunk_processed.connect(self._on_chunk_processed)
-        self.proc_worker.finished.connect(self._on_finished)
-        self.proc_worker.error_occurred.connect(self._on_error)
+        self.proc_worker.signals.progress_updated.connect(self._on_progress)
+        self.proc_worker.signals.chunk_processed.connect(self._on_chunk_processed)
+        self.proc_worker.signals.finished.connect(self._on_finished)
+        self.proc_worker.signals.error_occurred.connect(self._on_error)
         self.proc_worker.start()
 
     def _cancel_processing(self):
@@ -540,23 +1311,85 @@ class TextAnonymizer(QMainWindow):
         self.progress_label.setText(f"Processing {current} of {total} chunks...")
         self.statusBar().showMessage(f"Processing chunk {current} of {total}")
 
-    def _on_chunk_processed(self, original: str, anonymized: str):
-        # Hook for live preview if you want to show per-chunk results
-        pass
+    # ---------------- Results temp file ----------------
 
-    def _on_finished(self, anonymized_chunks: List[str]):
-        self.anonymized_chunks = anonymized_chunks
+    def _open_results_file(self):
+        self._discard_results()
+        # 1 MiB buffer: results are only read back after the file is closed, so there is no need to flush per chunk
+        self._results_file = tempfile.NamedTemporaryFile(
+            mode="w", suffix=".txt", prefix="anonymized_", delete=False, encoding="utf-8", buffering=1 << 20
+        )
+        self._results_path = self._results_file.name
+        self._pending_results = {}
+        self._next_result = 0
+        self._results_written = 0
+
+    def _write_result(self, text: str):
+        if self._results_written:
+            self._results_file.write("\n\n")
+        self._results_file.write(text)
+        self._results_written += 1
+
+    def _close_results_file(self):
+        if self._results_file is not None:
+            self._results_file.close()
+            self._results_file = None
+
+    def _discard_results(self):
+        self._close_results_file()
+        if self._results_path:
+            try:
+                os.remove(self._results_path)
+            except OSError:
+                pass
+        self._results_path = None
+        self._pending_results = {}
+        self._results_written = 0
+
+    def _on_chunk_processed(self, index: int, anonymized: str):
+        # Ignore late signals from a worker that was replaced by a newer job
+        if self.sender() is not self.proc_worker.signals or self._results_file is None:
+            return
+        # Chunks finish out of order; hold them until every earlier chunk has been written
+        for pos in self._job_positions[index]:
+            self._pending_results[pos] = anonymized
+        while self._next_result in self._pending_results:
+            self._write_result(self._pending_results.pop(self._next_result) or self._job_chunks[self._next_result])
+            self._next_result += 1
+
+    def _on_finished(self, failed: List[int]):
+        if self.sender() is not self.proc_worker.signals:
+            return
+        if self._results_file is not None:
+            # After a cancel there can be gaps; keep whatever finished, in document order
+            for index in sorted(self._pending_results):
+                self._write_result(self._pending_results[index] or self._job_chunks[index])
+            self._pending_results = {}
+            self._close_results_file()
+        failed_positions = sum(len(self._job_positions[i]) for i in failed)
+        self._job_chunks = []
+        self._job_positions = []
+        processed = self._results_written
+        cancelled = self.proc_worker.cancelled
         self.process_btn.setVisible(True)
         self.process_btn.setEnabled(True)
         self.cancel_btn.setVisible(False)
         self.progress_bar.setVisible(False)
         self.progress_label.setVisible(False)
-        self.download_btn.setEnabled(True)
+        self.download_btn.setEnabled(processed > 0)
 
-        self.statusBar().showMessage(f"Anonymization complete! {len(anonymized_chunks)} chunks processed.")
+        if cancelled:
+            self.statusBar().showMessage(f"Processing cancelled after {processed} completed chunks.")
+            return
+
+        self.statusBar().showMessage(f"Anonymization complete! {processed} chunks processed.")
+        note = (
+            f"\n\n{failed_positions} chunk(s) failed and were kept as original text - review them before sharing."
+            if failed_positions else ""
+        )
         QMessageBox.information(
             self, "Anonymization Complete",
-            f"Successfully processed {len(anonymized_chunks)} chunks. You can now download the anonymized text."
+            f"Successfully processed {processed} chunks. You can now download the anonymized text.{note}"
         )
 
     def _on_error(self, message: str):
@@ -564,7 +1397,7 @@ class TextAnonymizer(QMainWindow):
         print("Worker error:", message)
 
     def _download_results(self):
-        if not self.anonymized_chunks:
+        if not self._results_path or self._results_file is not None or not os.path.exists(self._results_path):
             QMessageBox.warning(self, "No Results", "No anonymized results to download.")
             return
         file_path, _ = QFileDialog.getSaveFileName(
@@ -573,10 +1406,9 @@ class TextAnonymizer(QMainWindow):
         if not file_path:
             return
         try:
-            with open(file_path, "w", encoding="utf-8") as f:
-                f.write("\n\n".join(self.anonymized_chunks))
+            shutil.move(self._results_path, file_path)
+            self._results_path = None
             QMessageBox.information(self, "Download Complete", f"Anonymized text saved to: {file_path}")
-            self.anonymized_chunks = []
             self.download_btn.setEnabled(False)
             self.statusBar().showMessage("Results downloaded and cleaned up")
         except Exception as e:
@@ -589,6 +1421,8 @@ class TextAnonymizer(QMainWindow):
         if self.proc_worker and self.proc_worker.isRunning():
             self.proc_worker.cancel()
             self.proc_worker.wait()
+        self.chunk_cache.close()
+        self._discard_results()
         event.accept()
 
 